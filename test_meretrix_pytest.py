@@ -1,7 +1,7 @@
 """
 PyTest suite for MeretrixCoin.
 - Uses your local Solidity sources: ./Meretrix.sol and ./price.sol (or ./contracts/* if present).
-- Auto-installs required Python libs if not present (using only os + sys).
+- Auto-installs required Python libs if not present (one pip subprocess for everything missing).
 - Compiles with solc 0.8.21 and runs entirely in-memory (EthereumTester + PyEVMBackend).
 - No MockERC20 usage.
 
@@ -18,19 +18,39 @@ Enhancements vs. baseline:
 """
 
 from __future__ import annotations
-import os, sys, pathlib, json, typing as t
-
-# --- Auto-install required libs (os + sys only) ---
-def ensure(pkg: str, version: str) -> None:
+import os, sys, pathlib, json, hashlib, subprocess, functools, importlib.metadata, typing as t
+
+# --- Auto-install required libs (single pip invocation) ---
+WANTED = [
+    ("web3", "6.16.0"),
+    ("eth-tester", "0.10.0b2"),
+    ("py-solc-x", "1.1.1"),
+    ("pytest", "8.3.2"),
+]
+# Any installed version is fine for these; the pin is only used when the package is missing.
+# (pytest is already running this module, so reinstalling it mid-collection would be destructive.)
+ANY_VERSION_OK = {"pytest"}
+
+
+def _needs_install(pkg: str, version: str) -> bool:
+    # Read installed metadata only; importing e.g. web3 just to check it costs ~100ms.
     try:
-        __import__(pkg.replace("-", "_"))
-    except ImportError:
-        os.system(f"{sys.executable} -m pip install {pkg}=={version}")
+        have = importlib.metadata.version(pkg)
+    except importlib.metadata.PackageNotFoundError:
+        return True
+    return pkg not in ANY_VERSION_OK and have != version
+
 
-ensure("web3", "6.16.0")
-ensure("eth-tester", "0.10.0b2")
-ensure("py-solc-x", "1.1.1")
-ensure("pytest", "8.3.2")
+def ensure(wanted: list[tuple[str, str]]) -> None:
+    missing = [(pkg, ver) for pkg, ver in wanted if _needs_install(pkg, ver)]
+    if missing:
+        subprocess.check_call([
+            sys.executable, "-m", "pip", "install",
+            "--quiet", "--disable-pip-version-check", "--no-input",
+            *[f"{pkg}=={ver}" for pkg, ver in missing],
+        ])
+
+ensure(WANTED)
 
 # --- Imports (after ensure) ---
 import pytest
@@ -38,66 +58,138 @@ from web3 import Web3
 from web3.contract.contract import Contract
 from web3.providers.eth_tester import EthereumTesterProvider
 from eth_tester import EthereumTester, PyEVMBackend
+from eth_tester.exceptions import TransactionFailed
+from eth_utils import ValidationError
 from solcx import compile_standard, install_solc, set_solc_version
 from web3.exceptions import ContractLogicError
+from web3.types import TxReceipt
+
+# Optional: pytest-shared-session-scope lets xdist workers compile once and share the JSON output.
+try:
+    from pytest_shared_session_scope import shared_session_scope_json
+except ImportError:
+    shared_session_scope_json = None
 
 SOLC_VERSION = "0.8.21"
+# Per-user cache (not the shared temp dir), so other local users cannot plant ABI/bytecode.
+SOLC_CACHE_DIR = pathlib.Path(os.environ.get("XDG_CACHE_HOME") or pathlib.Path.home() / ".cache") / "meretrix_solc"
+# Per-call gas limits (estimates, not measured); anything unlisted gets DEFAULT_GAS.
+# A limit that turns out too low fails loudly as out-of-gas in _transact, never as a revert.
+GAS_LIMITS = {
+    "constructor": 4_500_000,
+    "buy": 500_000,
+    "buyTo": 500_000,
+    "withdraw": 300_000,
+    "pause": 100_000,
+    "unpause": 100_000,
+    "transfer": 100_000,
+}
+DEFAULT_GAS = 6_000_000
+NUM_ACCOUNTS = 4  # deployer, alice, bob, attacker
+
+
+SOLC_SETTINGS = {
+    "optimizer": {"enabled": True, "runs": 200},
+    "evmVersion": "paris",
+    "remappings": [
+        "@openzeppelin/=node_modules/@openzeppelin/"
+    ],
+    # Only Meretrix.sol needs bytecode; imports (OpenZeppelin etc.) are type-checked but not code-generated.
+    # Meretrix.sol keeps a "*" contract selector so the first-contract fallback in `env` still works.
+    "outputSelection": {
+        "Meretrix.sol": {"*": ["abi", "evm.bytecode.object"]},
+        "price.sol": {"*": ["abi"]},
+        "*": {"*": []},
+    },
+}
+SOURCE_NAMES = ("Meretrix.sol", "price.sol")
+SOURCE_DIRS = (pathlib.Path("."), pathlib.Path("./contracts"))
+
+
+@functools.lru_cache(maxsize=1)
+def _ensure_solc() -> None:
+    """Install (if needed) and select solc once per process."""
+    install_solc(SOLC_VERSION)
+    set_solc_version(SOLC_VERSION)
 
 
 # ---- Helpers: read your Solidity files from disk ----
-def _read_sources() -> dict:
+def _locate_sources() -> dict[str, pathlib.Path]:
     """
-    Locate and read Meretrix.sol and price.sol from either CWD or ./contracts/.
-    Returns a dict suitable for solcx compile_standard 'sources'.
+    Locate Meretrix.sol and price.sol in either CWD or ./contracts/ (CWD wins).
+    Stops searching as soon as both files are found.
     """
-    candidates = [pathlib.Path("."), pathlib.Path("./contracts")]
-    needed = ["Meretrix.sol", "price.sol"]
-    found: dict[str, dict[str, str]] = {}
-
-    for base in candidates:
-        for name in needed:
+    found: dict[str, pathlib.Path] = {}
+    for base in SOURCE_DIRS:
+        for name in SOURCE_NAMES:
             p = base / name
-            if p.exists() and name not in found:
-                found[name] = {"content": p.read_text(encoding="utf-8")}
+            if name not in found and p.exists():
+                found[name] = p
+        if len(found) == len(SOURCE_NAMES):
+            return found
+
+    missing = [n for n in SOURCE_NAMES if n not in found]
+    raise FileNotFoundError(
+        f"Missing Solidity sources: {missing}. "
+        f"Place Meretrix.sol and price.sol in the repo root or ./contracts/"
+    )
 
-    missing = [n for n in needed if n not in found]
-    if missing:
-        raise FileNotFoundError(
-            f"Missing Solidity sources: {missing}. "
-            f"Place Meretrix.sol and price.sol in the repo root or ./contracts/"
-        )
-    return found
+
+def _read_sources(paths: dict[str, pathlib.Path]) -> dict:
+    """Read located sources into a dict suitable for solcx compile_standard 'sources'."""
+    return {name: {"content": p.read_text(encoding="utf-8")} for name, p in paths.items()}
 
 
 def _compile_contracts() -> dict:
     """
     Compile Meretrix.sol + price.sol with solc 0.8.21.
     Remapping enables OpenZeppelin imports via node_modules if present.
+    The standard-JSON output is cached on disk, keyed by (path, mtime_ns, size) of every *.sol
+    in the source dirs (so local imports like IERC20.sol/ownership.sol count) + compiler + settings,
+    so unchanged sources are never even read.
+    Caveat: remapped imports under node_modules/ are NOT fingerprinted; after upgrading
+    OpenZeppelin, set MRTX_SOLC_NOCACHE=1 to force a fresh compile.
     """
-    install_solc(SOLC_VERSION)
-    set_solc_version(SOLC_VERSION)
-
-    sources = _read_sources()
-    settings = {
-        "optimizer": {"enabled": True, "runs": 200},
-        "evmVersion": "paris",
-        "remappings": [
-            "@openzeppelin/=node_modules/@openzeppelin/"
-        ],
-        "outputSelection": {"*": {"*": ["abi", "evm.bytecode.object"]}},
-    }
-
+    paths = _locate_sources()
+    fingerprint = {}
+    for base in SOURCE_DIRS:
+        for p in sorted(base.glob("*.sol")):
+            st = os.stat(p)
+            fingerprint[str(p.resolve())] = (st.st_mtime_ns, st.st_size)
+
+    key = hashlib.sha256(
+        json.dumps(fingerprint, sort_keys=True).encode()
+        + SOLC_VERSION.encode()
+        + json.dumps(SOLC_SETTINGS, sort_keys=True).encode()
+    ).hexdigest()
+    cache_file = SOLC_CACHE_DIR / f"{key}.json"
+    use_cache = os.environ.get("MRTX_SOLC_NOCACHE") != "1"
+    if use_cache and cache_file.exists():
+        with cache_file.open(encoding="utf-8") as fh:
+            return json.load(fh)
+
+    _ensure_solc()
     compiled = compile_standard(
-        {"language": "Solidity", "sources": sources, "settings": settings},
+        {"language": "Solidity", "sources": _read_sources(paths), "settings": SOLC_SETTINGS},
         allow_paths=".:./node_modules"
     )
+
+    # Write to a temp file first, then swap in atomically so concurrent runs never see partial JSON.
+    SOLC_CACHE_DIR.mkdir(mode=0o700, parents=True, exist_ok=True)
+    tmp = cache_file.with_suffix(f".{os.getpid()}.tmp")
+    try:
+        tmp.write_text(json.dumps(compiled), encoding="utf-8")
+        os.replace(tmp, cache_file)
+    finally:
+        tmp.unlink(missing_ok=True)
     return compiled
 
 
 # ---- PyTest fixtures ----
 @pytest.fixture(scope="session")
 def w3() -> Web3:
-    backend = PyEVMBackend()
+    # Only NUM_ACCOUNTS keys are derived/funded (default is 10); the tests never use more.
+    backend = PyEVMBackend(genesis_state=PyEVMBackend.generate_genesis_state(num_accounts=NUM_ACCOUNTS))
     provider = EthereumTesterProvider(EthereumTester(backend=backend))
     return Web3(provider)
 
@@ -115,26 +207,79 @@ def accounts(w3: Web3) -> dict:
     }
 
 
+# Only the (JSON-serializable) ABI/bytecode is shared across xdist workers; each worker still
+# boots its own PyEVM chain in `w3`, since EVM state cannot cross process boundaries.
+if shared_session_scope_json:
+    @shared_session_scope_json()
+    def compiled() -> t.Iterator[dict]:
+        # Two-yield protocol: the first yield receives the stored value (None on the first worker);
+        # only the second yield's value is written to the shared store.
+        initial = yield
+        data = initial if initial is not None else _compile_contracts()
+        yield data
+else:
+    @pytest.fixture(scope="session")
+    def compiled() -> dict:
+        return _compile_contracts()
+
+
 @pytest.fixture(scope="session")
-def compiled() -> dict:
-    return _compile_contracts()
+def nonces() -> dict[str, int]:
+    """Next nonce per sender; filled lazily from the chain by _next_nonce()."""
+    return {}
+
+
+def _next_nonce(w3: Web3, nonces: dict[str, int], addr: str) -> int:
+    if addr not in nonces:
+        nonces[addr] = w3.eth.get_transaction_count(addr)
+    n = nonces[addr]
+    nonces[addr] = n + 1
+    return n
 
 
-def _deploy(w3: Web3, abi: list, bytecode: str, args: tuple = (), from_: str | None = None, value: int = 0) -> Contract:
+def _transact(w3: Web3, nonces: dict[str, int], fn_or_txdict, sender: str, value: int, gas: int) -> TxReceipt:
+    """
+    Send a contract call/constructor via .transact(), or a raw tx dict via eth.send_transaction().
+    EthereumTester auto-mines synchronously, so the receipt exists as soon as the hash is returned.
+    Every revert surfaces as ContractLogicError: eth-tester either raises TransactionFailed or,
+    with an explicit gas limit, mines the tx with status 0 and raises nothing.
+    A status-0 tx that used its whole gas limit is out-of-gas, not a revert; that raises
+    AssertionError so a too-low limit fails the test instead of satisfying pytest.raises.
+    """
+    tx = {"from": sender, "nonce": _next_nonce(w3, nonces, sender), "value": value, "gas": gas, "gasPrice": 0}
+    try:
+        if isinstance(fn_or_txdict, dict):
+            tx_hash = w3.eth.send_transaction({**fn_or_txdict, **tx})
+        else:
+            tx_hash = fn_or_txdict.transact(tx)
+        rc = w3.eth.get_transaction_receipt(tx_hash)
+    except TransactionFailed as exc:
+        nonces.pop(sender, None)
+        raise ContractLogicError(str(exc)) from exc
+    except Exception:
+        # A failed send may or may not have consumed the nonce; resync from chain next time.
+        nonces.pop(sender, None)
+        raise
+    # Mined either way: the nonce was consumed, so the cache is still correct.
+    if rc["status"] == 0 and rc["gasUsed"] == gas:
+        raise AssertionError(f"transaction ran out of gas (limit {gas}): {tx_hash.hex()}")
+    if rc["status"] == 0:
+        raise ContractLogicError(f"transaction reverted (status 0): {tx_hash.hex()}")
+    return rc
+
+
+def _deploy(w3: Web3, nonces: dict[str, int], factory: type[Contract], args: tuple = (), from_: str | None = None, value: int = 0) -> Contract:
     sender = from_ or w3.eth.accounts[0]
-    tx = w3.eth.contract(abi=abi, bytecode=bytecode).constructor(*args).build_transaction({
-        "from": sender,
-        "nonce": w3.eth.get_transaction_count(sender),
-        "value": value,
-        "gas": 8_000_000,
-        "gasPrice": 0,
-    })
-    rc = w3.eth.wait_for_transaction_receipt(w3.eth.send_transaction(tx))
-    return w3.eth.contract(address=rc.contractAddress, abi=abi)
+    rc = _transact(w3, nonces, factory.constructor(*args), sender, value, GAS_LIMITS["constructor"])
+    return factory(address=rc.contractAddress)
 
 
-@pytest.fixture()
-def env(w3: Web3, compiled: dict, accounts: dict) -> dict:
+@pytest.fixture(scope="session")
+def coin_factory(w3: Web3, compiled: dict) -> type[Contract]:
+    """
+    MeretrixCoin contract factory, built once so web3 parses/validates the ABI a single time.
+    Kept separate from `compiled`, which must stay JSON-serializable to be shared across workers.
+    """
     # The main contract should be named MeretrixCoin inside Meretrix.sol.
     try:
         mABI = compiled["contracts"]["Meretrix.sol"]["MeretrixCoin"]["abi"]
@@ -147,394 +292,312 @@ def env(w3: Web3, compiled: dict, accounts: dict) -> dict:
         k0 = keys[0]
         mABI = compiled["contracts"]["Meretrix.sol"][k0]["abi"]
         mBIN = compiled["contracts"]["Meretrix.sol"][k0]["evm"]["bytecode"]["object"]
+    return w3.eth.contract(abi=mABI, bytecode=mBIN)
 
+
+@pytest.fixture(scope="session")
+def env(w3: Web3, coin_factory: type[Contract], accounts: dict, nonces: dict[str, int]) -> dict:
+    """
+    Deploy MeretrixCoin once per session and snapshot the chain right after deployment.
+    Tests should request `env_fresh`, which rewinds to that snapshot on teardown.
+    """
     # Constructor params (treasury, k, maxPerTx) — adjust if your signature differs.
     TREASURY = 1_000_000 * 10**18
     K = 1
     MAX_TX = 50_000 * 10**18
 
-    coin = _deploy(w3, mABI, mBIN, (TREASURY, K, MAX_TX), from_=accounts["deployer"])
-    return {"w3": w3, "coin": coin, "acc": accounts}
+    coin = _deploy(w3, nonces, coin_factory, (TREASURY, K, MAX_TX), from_=accounts["deployer"])
+    tester: EthereumTester = w3.provider.ethereum_tester
+    return {
+        "w3": w3, "coin": coin, "acc": accounts, "nonces": nonces,
+        "tester": tester, "snapshot": tester.take_snapshot(),
+        # Read straight from the py-evm header; skips serializing a full block over the RPC layer.
+        "base_ts": tester.backend.chain.get_canonical_head().timestamp,
+        # ABI indexes so optional-feature checks are dict/set lookups instead of ABI scans
+        "events": {e["name"]: e for e in coin.abi if e.get("type") == "event"},
+        "fns": {f["name"] for f in coin.abi if f.get("type") == "function"},
+    }
+
+
+@pytest.fixture()
+def env_fresh(env: dict) -> t.Iterator[dict]:
+    """Per-test view of the session `env`; reverts the EVM to the post-deploy snapshot afterwards."""
+    yield env
+    tester: EthereumTester = env["tester"]
+    tester.revert_to_snapshot(env["snapshot"])
+    env["snapshot"] = tester.take_snapshot()
+    # Reverting rewinds account nonces too; drop the cache so it is re-read from chain.
+    env["nonces"].clear()
+
+
+@pytest.fixture(scope="session")
+def initial_price(env: dict) -> int:
+    """currentPrice() at the post-deploy snapshot, i.e. at the start of every test."""
+    return _price(env)
+
+
+@pytest.fixture(scope="session")
+def max_per_tx(env: dict) -> int:
+    return env["coin"].functions.maxPerTx().call()
+
+
+ALICE_SEED_AMOUNT = 5_000 * 10**18
+
+
+@pytest.fixture(scope="session")
+def alice_seed(env: dict, initial_price: int) -> dict:
+    """
+    One buy of ALICE_SEED_AMOUNT by alice on top of the post-deploy state, snapshotted.
+    Rewinds to the post-deploy snapshot itself first, so it never builds on leftover test state,
+    and rewinds again if the buy fails so a mined status-0 tx is not left on the shared chain.
+    """
+    tester: EthereumTester = env["tester"]
+    tester.revert_to_snapshot(env["snapshot"])
+    env["nonces"].clear()
+    coin, acc = env["coin"], env["acc"]
+    cost = initial_price * ALICE_SEED_AMOUNT
+    try:
+        _send(env, coin.functions.buy(ALICE_SEED_AMOUNT, initial_price, _deadline(env)),
+              sender=acc["alice"], value=cost)
+    except BaseException:
+        tester.revert_to_snapshot(env["snapshot"])
+        env["nonces"].clear()
+        raise
+    return {"amount": ALICE_SEED_AMOUNT, "cost": cost, "snapshot": env["tester"].take_snapshot()}
+
+
+@pytest.fixture()
+def env_with_alice_tokens(env_fresh: dict, alice_seed: dict) -> dict:
+    """Like env_fresh, but starting from the alice_seed snapshot (ETH in contract, tokens on alice)."""
+    env_fresh["tester"].revert_to_snapshot(alice_seed["snapshot"])
+    env_fresh["nonces"].clear()
+    return {**env_fresh, "seed": alice_seed}
 
 
 # ---- Utility helpers ----
 
-def _deadline(w3: Web3, seconds: int = 3600) -> int:
-    return int(w3.eth.get_block("latest")["timestamp"]) + seconds
+def _deadline(env: dict, seconds: int = 3600) -> int:
+    # Tests never advance time, so the post-deploy head timestamp is a stable base.
+    return env["base_ts"] + seconds
+
+
+def _send(env: dict, fn_or_txdict, *, sender: str, value: int = 0, gas: int | None = None) -> TxReceipt:
+    """
+    Send a contract function call (or raw tx dict) from `sender` and return its receipt.
+    Gas defaults to GAS_LIMITS[fn_name] for contract calls.
+    """
+    if gas is None:
+        gas = GAS_LIMITS.get(getattr(fn_or_txdict, "fn_name", None), DEFAULT_GAS)
+    return _transact(env["w3"], env["nonces"], fn_or_txdict, sender, value, gas)
 
 
 def _price(env: dict) -> int:
     return env["coin"].functions.currentPrice().call()
 
 
-def _has_fn(contract: Contract, fn_name: str) -> bool:
-    try:
-        getattr(contract.functions, fn_name)
-        return True
-    except AttributeError:
-        return False
+def _has_fn(env: dict, fn_name: str) -> bool:
+    return fn_name in env["fns"]
 
 
-def _event_abi(contract: Contract, name: str) -> dict | None:
-    for e in contract.abi:
-        if e.get("type") == "event" and e.get("name") == name:
-            return e
-    return None
+def _event_abi(env: dict, name: str) -> dict | None:
+    return env["events"].get(name)
 
 
 # ---- Tests ----
 
-def test_deploy_has_treasury(env):
-    coin: Contract = env["coin"]
+def test_deploy_has_treasury(env_fresh):
+    coin: Contract = env_fresh["coin"]
     supply = coin.functions.balanceOf(coin.address).call()
     assert supply == 1_000_000 * 10**18
     assert coin.functions.name().call() == "Meretrix"
     assert coin.functions.symbol().call() == "MRTX"
 
 
-def test_buy_happy_path(env):
-    w3, coin, acc = env["w3"], env["coin"], env["acc"]
+def test_buy_happy_path(env_fresh, initial_price):
+    w3, coin, acc = env_fresh["w3"], env_fresh["coin"], env_fresh["acc"]
     amount = 1_000 * 10**18
-    price = _price(env)
+    price = initial_price
     cost = price * amount
-    deadline = _deadline(w3)
+    deadline = _deadline(env_fresh)
 
     # alice buys
-    tx = coin.functions.buy(amount, price, deadline).build_transaction({
-        "from": acc["alice"],
-        "nonce": w3.eth.get_transaction_count(acc["alice"]),
-        "value": cost,
-        "gas": 6_000_000,
-        "gasPrice": 0,
-    })
-    rc = w3.eth.wait_for_transaction_receipt(w3.eth.send_transaction(tx))
+    rc = _send(env_fresh, coin.functions.buy(amount, price, deadline), sender=acc["alice"], value=cost)
 
     assert coin.functions.balanceOf(acc["alice"]).call() == amount
     assert coin.functions.balanceOf(coin.address).call() == (1_000_000 * 10**18 - amount)
     assert w3.eth.get_balance(coin.address) == cost
 
     # Optional: assert Buy event if present
-    ev = _event_abi(coin, "Bought")
+    ev = _event_abi(env_fresh, "Bought")
     if ev:
         logs = list(coin.events.Bought().process_receipt(rc))
         assert logs and logs[0]["args"]["buyer"] == acc["alice"]
 
 
-def test_buyTo_third_party(env):
-    w3, coin, acc = env["w3"], env["coin"], env["acc"]
+def test_buyTo_third_party(env_fresh, initial_price):
+    coin, acc = env_fresh["coin"], env_fresh["acc"]
     amount = 1_234 * 10**18
-    price = _price(env)
+    price = initial_price
     cost = price * amount
-    deadline = _deadline(w3)
+    deadline = _deadline(env_fresh)
 
     # alice buys for bob
-    tx = coin.functions.buyTo(acc["bob"], amount, price, deadline).build_transaction({
-        "from": acc["alice"],
-        "nonce": w3.eth.get_transaction_count(acc["alice"]),
-        "value": cost,
-        "gas": 6_000_000,
-        "gasPrice": 0,
-    })
-    w3.eth.wait_for_transaction_receipt(w3.eth.send_transaction(tx))
+    _send(env_fresh, coin.functions.buyTo(acc["bob"], amount, price, deadline), sender=acc["alice"], value=cost)
 
     assert coin.functions.balanceOf(acc["bob"]).call() == amount
 
 
-def test_buy_reverts_basic(env):
-    w3, coin, acc = env["w3"], env["coin"], env["acc"]
-    price = _price(env)
-
-    # stale deadline
-    with pytest.raises(Exception):
-        tx = coin.functions.buy(1, price, _deadline(w3, -10)).build_transaction({
-            "from": acc["alice"],
-            "nonce": w3.eth.get_transaction_count(acc["alice"]),
-            "value": price,
-            "gas": 6_000_000,
-            "gasPrice": 0,
-        })
-        w3.eth.wait_for_transaction_receipt(w3.eth.send_transaction(tx))
-
-    # amount zero
-    with pytest.raises(Exception):
-        tx = coin.functions.buy(0, price, _deadline(w3)).build_transaction({
-            "from": acc["alice"],
-            "nonce": w3.eth.get_transaction_count(acc["alice"]),
-            "value": 0,
-            "gas": 6_000_000,
-            "gasPrice": 0,
-        })
-        w3.eth.wait_for_transaction_receipt(w3.eth.send_transaction(tx))
-
-    # amount > maxPerTx (read from contract)
-    max_per_tx = coin.functions.maxPerTx().call()
-    with pytest.raises(Exception):
-        too_much = max_per_tx + 1
-        tx = coin.functions.buy(too_much, price, _deadline(w3)).build_transaction({
-            "from": acc["alice"],
-            "nonce": w3.eth.get_transaction_count(acc["alice"]),
-            "value": price * too_much,
-            "gas": 7_000_000,
-            "gasPrice": 0,
-        })
-        w3.eth.wait_for_transaction_receipt(w3.eth.send_transaction(tx))
-
-
-@pytest.mark.parametrize("fn_name", ["buy", "buyTo"])
-def test_buy_reverts_on_wrong_price_or_value(env, fn_name):
-    """If contract validates msg.value == price*amount and exact price, both should revert when mismatched."""
-    w3, coin, acc = env["w3"], env["coin"], env["acc"]
-    if not _has_fn(coin, fn_name):
-        pytest.skip(f"{fn_name} not present in ABI")
-
-    amount = 10 * 10**18
-    price = _price(env)
-    deadline = _deadline(w3)
-
-    # 1) Wrong msg.value (too low)
-    with pytest.raises(Exception):
-        if fn_name == "buy":
-            fn = coin.functions.buy(amount, price, deadline)
-        else:
-            fn = coin.functions.buyTo(acc["bob"], amount, price, deadline)
-        tx = fn.build_transaction({
-            "from": acc["alice"],
-            "nonce": w3.eth.get_transaction_count(acc["alice"]),
-            "value": price * amount - 1,
-            "gas": 6_000_000,
-            "gasPrice": 0,
-        })
-        w3.eth.wait_for_transaction_receipt(w3.eth.send_transaction(tx))
-
-    # 2) Wrong quoted price (off by 1)
-    with pytest.raises(Exception):
-        quoted = price + 1
-        if fn_name == "buy":
-            fn = coin.functions.buy(amount, quoted, deadline)
-        else:
-            fn = coin.functions.buyTo(acc["bob"], amount, quoted, deadline)
-        tx = fn.build_transaction({
-            "from": acc["alice"],
-            "nonce": w3.eth.get_transaction_count(acc["alice"]),
-            "value": price * amount,
-            "gas": 6_000_000,
-            "gasPrice": 0,
-        })
-        w3.eth.wait_for_transaction_receipt(w3.eth.send_transaction(tx))
-
-
-def test_pause_blocks_buy_and_transfers(env):
-    w3, coin, acc = env["w3"], env["coin"], env["acc"]
-
-    # buy a bit first so alice has balance
+# Each case starts from a valid purchase (exact price, exact value, deadline 1h ahead) and skews one input.
+# amount=None means maxPerTx + 1, which is only known after deployment.
+# may_fail_validation: msg.value may exceed the sender's ETH, which eth-tester rejects before execution
+# with eth_utils' ValidationError (an Exception subclass, not ValueError).
+BUY_REVERT_CASES = [
+    pytest.param({"fn": "buy", "amount": 1, "deadline_delta": -10}, id="stale-deadline"),
+    pytest.param({"fn": "buy", "amount": 0}, id="amount-zero"),
+    pytest.param({"fn": "buy", "amount": None, "may_fail_validation": True}, id="above-maxPerTx"),
+    pytest.param({"fn": "buy", "amount": 10 * 10**18, "value_delta": -1}, id="buy-value-too-low"),
+    pytest.param({"fn": "buy", "amount": 10 * 10**18, "price_delta": 1}, id="buy-wrong-quote"),
+    pytest.param({"fn": "buyTo", "amount": 10 * 10**18, "value_delta": -1}, id="buyTo-value-too-low"),
+    pytest.param({"fn": "buyTo", "amount": 10 * 10**18, "price_delta": 1}, id="buyTo-wrong-quote"),
+]
+
+
+@pytest.mark.parametrize("case", BUY_REVERT_CASES)
+def test_buy_reverts(env_fresh, initial_price, max_per_tx, case):
+    """Stale deadline, zero/oversized amount, short msg.value or a wrong quoted price must all revert."""
+    coin, acc = env_fresh["coin"], env_fresh["acc"]
+    if not _has_fn(env_fresh, case["fn"]):
+        pytest.skip(f"{case['fn']} not present in ABI")
+
+    amount = max_per_tx + 1 if case["amount"] is None else case["amount"]
+    quoted = initial_price + case.get("price_delta", 0)
+    value = initial_price * amount + case.get("value_delta", 0)
+    deadline = _deadline(env_fresh, case.get("deadline_delta", 3600))
+
+    if case["fn"] == "buy":
+        fn = coin.functions.buy(amount, quoted, deadline)
+    else:
+        fn = coin.functions.buyTo(acc["bob"], amount, quoted, deadline)
+    expected = (ContractLogicError, ValidationError) if case.get("may_fail_validation") else ContractLogicError
+    with pytest.raises(expected):
+        _send(env_fresh, fn, sender=acc["alice"], value=value)
+
+
+def test_pause_blocks_buy_and_transfers(env_with_alice_tokens):
+    env = env_with_alice_tokens
+    coin, acc = env["coin"], env["acc"]
+    # alice already holds tokens; price may have moved since deployment
     price = _price(env)
-    amt = 100 * 10**18
-    cost = price * amt
-    deadline = _deadline(w3)
-    rc_buy = w3.eth.wait_for_transaction_receipt(w3.eth.send_transaction(
-        coin.functions.buy(amt, price, deadline).build_transaction({
-            "from": acc["alice"],
-            "nonce": w3.eth.get_transaction_count(acc["alice"]),
-            "value": cost,
-            "gas": 6_000_000, "gasPrice": 0
-        })
-    ))
 
     # pause by deployer (has PAUSER_ROLE per your constructor)
-    rc_pause = w3.eth.wait_for_transaction_receipt(w3.eth.send_transaction(
-        coin.functions.pause().build_transaction({
-            "from": acc["pauser"],
-            "nonce": w3.eth.get_transaction_count(acc["pauser"]),
-            "gas": 3_000_000, "gasPrice": 0
-        })
-    ))
+    rc_pause = _send(env, coin.functions.pause(), sender=acc["pauser"])
 
     # Optional: assert Paused event if present
-    ev = _event_abi(coin, "Paused")
+    ev = _event_abi(env, "Paused")
     if ev:
         logs = list(coin.events.Paused().process_receipt(rc_pause))
         assert logs, "Paused event not emitted"
 
     # buy should revert while paused
-    with pytest.raises(Exception):
-        w3.eth.wait_for_transaction_receipt(w3.eth.send_transaction(
-            coin.functions.buy(1 * 10**18, price, _deadline(w3)).build_transaction({
-                "from": acc["alice"],
-                "nonce": w3.eth.get_transaction_count(acc["alice"]),
-                "value": price,
-                "gas": 6_000_000, "gasPrice": 0
-            })
-        ))
+    with pytest.raises(ContractLogicError):
+        _send(env, coin.functions.buy(1 * 10**18, price, _deadline(env)), sender=acc["alice"], value=price)
 
     # transfer should also revert via _update() Paused hook
-    with pytest.raises(Exception):
-        w3.eth.wait_for_transaction_receipt(w3.eth.send_transaction(
-            coin.functions.transfer(acc["bob"], 1 * 10**18).build_transaction({
-                "from": acc["alice"],
-                "nonce": w3.eth.get_transaction_count(acc["alice"]),
-                "gas": 300_000, "gasPrice": 0
-            })
-        ))
+    with pytest.raises(ContractLogicError):
+        _send(env, coin.functions.transfer(acc["bob"], 1 * 10**18), sender=acc["alice"])
 
     # unpause
-    rc_unpause = w3.eth.wait_for_transaction_receipt(w3.eth.send_transaction(
-        coin.functions.unpause().build_transaction({
-            "from": acc["pauser"],
-            "nonce": w3.eth.get_transaction_count(acc["pauser"]),
-            "gas": 3_000_000, "gasPrice": 0
-        })
-    ))
+    rc_unpause = _send(env, coin.functions.unpause(), sender=acc["pauser"])
 
     # Optional: assert Unpaused event if present
-    evu = _event_abi(coin, "Unpaused")
+    evu = _event_abi(env, "Unpaused")
     if evu:
         logs = list(coin.events.Unpaused().process_receipt(rc_unpause))
         assert logs, "Unpaused event not emitted"
 
     # transfer works again
-    w3.eth.wait_for_transaction_receipt(w3.eth.send_transaction(
-        coin.functions.transfer(acc["bob"], 1 * 10**18).build_transaction({
-            "from": acc["alice"],
-            "nonce": w3.eth.get_transaction_count(acc["alice"]),
-            "gas": 300_000, "gasPrice": 0
-        })
-    ))
+    _send(env, coin.functions.transfer(acc["bob"], 1 * 10**18), sender=acc["alice"])
     assert coin.functions.balanceOf(acc["bob"]).call() == 1 * 10**18
 
 
-def test_pause_role_enforced(env):
+def test_pause_role_enforced(env_fresh):
     """Non-pauser should not be able to pause/unpause."""
-    w3, coin, acc = env["w3"], env["coin"], env["acc"]
+    coin, acc = env_fresh["coin"], env_fresh["acc"]
     # If pause exists, try with attacker
-    if not _has_fn(coin, "pause"):
+    if not _has_fn(env_fresh, "pause"):
         pytest.skip("pause() not present")
-    with pytest.raises(Exception):
-        w3.eth.wait_for_transaction_receipt(w3.eth.send_transaction(
-            coin.functions.pause().build_transaction({
-                "from": acc["attacker"],
-                "nonce": w3.eth.get_transaction_count(acc["attacker"]),
-                "gas": 3_000_000, "gasPrice": 0
-            })
-        ))
+    with pytest.raises(ContractLogicError):
+        _send(env_fresh, coin.functions.pause(), sender=acc["attacker"])
 
 
-def test_withdraw_happy_path(env):
+def test_withdraw_happy_path(env_with_alice_tokens):
+    env = env_with_alice_tokens
     w3, coin, acc = env["w3"], env["coin"], env["acc"]
-
-    # put ETH in contract via buy
-    price = _price(env)
-    amt = 5_000 * 10**18
-    cost = price * amt
-    deadline = _deadline(w3)
-    w3.eth.wait_for_transaction_receipt(w3.eth.send_transaction(
-        coin.functions.buy(amt, price, deadline).build_transaction({
-            "from": acc["alice"],
-            "nonce": w3.eth.get_transaction_count(acc["alice"]),
-            "value": cost,
-            "gas": 6_000_000, "gasPrice": 0
-        })
-    ))
+    # ETH in contract comes from alice's seed buy
+    cost = env["seed"]["cost"]
 
     before = w3.eth.get_balance(acc["bob"])
     # withdraw by treasurer (deployer)
-    rc = w3.eth.wait_for_transaction_receipt(w3.eth.send_transaction(
-        coin.functions.withdraw(acc["bob"], cost).build_transaction({
-            "from": acc["treasurer"],
-            "nonce": w3.eth.get_transaction_count(acc["treasurer"]),
-            "gas": 3_000_000, "gasPrice": 0
-        })
-    ))
+    rc = _send(env, coin.functions.withdraw(acc["bob"], cost), sender=acc["treasurer"])
     after = w3.eth.get_balance(acc["bob"])
     assert after - before == cost
 
     # Optional: Withdraw event exists?
-    ev = _event_abi(coin, "Withdrawn")
+    ev = _event_abi(env, "Withdrawn")
     if ev:
         logs = list(coin.events.Withdrawn().process_receipt(rc))
         assert logs and logs[0]["args"]["to"] == acc["bob"]
 
 
-def test_withdraw_role_and_bounds(env):
+def test_withdraw_role_and_bounds(env_with_alice_tokens):
+    env = env_with_alice_tokens
     w3, coin, acc = env["w3"], env["coin"], env["acc"]
-    price = _price(env)
-    amt = 100 * 10**18
-    cost = price * amt
-    deadline = _deadline(w3)
-    # seed contract with some ETH
-    w3.eth.wait_for_transaction_receipt(w3.eth.send_transaction(
-        coin.functions.buy(amt, price, deadline).build_transaction({
-            "from": acc["alice"],
-            "nonce": w3.eth.get_transaction_count(acc["alice"]),
-            "value": cost,
-            "gas": 6_000_000, "gasPrice": 0
-        })
-    ))
+    # contract already holds ETH from alice's seed buy
 
     # 1) Non-treasurer cannot withdraw
-    with pytest.raises(Exception):
-        w3.eth.wait_for_transaction_receipt(w3.eth.send_transaction(
-            coin.functions.withdraw(acc["bob"], 1).build_transaction({
-                "from": acc["attacker"],
-                "nonce": w3.eth.get_transaction_count(acc["attacker"]),
-                "gas": 1_000_000, "gasPrice": 0
-            })
-        ))
+    with pytest.raises(ContractLogicError):
+        _send(env, coin.functions.withdraw(acc["bob"], 1), sender=acc["attacker"])
 
     # 2) Cannot withdraw more than balance
-    bal = Web3(env["w3"]).eth.get_balance(coin.address)
-    with pytest.raises(Exception):
-        w3.eth.wait_for_transaction_receipt(w3.eth.send_transaction(
-            coin.functions.withdraw(acc["bob"], bal + 1).build_transaction({
-                "from": acc["treasurer"],
-                "nonce": w3.eth.get_transaction_count(acc["treasurer"]),
-                "gas": 1_000_000, "gasPrice": 0
-            })
-        ))
-
-
-def test_buy_cannot_exceed_treasury(env):
+    bal = w3.eth.get_balance(coin.address)
+    with pytest.raises(ContractLogicError):
+        _send(env, coin.functions.withdraw(acc["bob"], bal + 1), sender=acc["treasurer"])
+
+
+def test_buy_cannot_exceed_treasury(env_fresh, initial_price):
     """Attempt to buy more tokens than remaining in the treasury should revert."""
-    w3, coin, acc = env["w3"], env["coin"], env["acc"]
+    coin, acc = env_fresh["coin"], env_fresh["acc"]
     remaining = coin.functions.balanceOf(coin.address).call()
-    price = _price(env)
-    deadline = _deadline(w3)
+    price = initial_price
+    deadline = _deadline(env_fresh)
 
-    with pytest.raises(Exception):
-        tx = coin.functions.buy(remaining + 1, price, deadline).build_transaction({
-            "from": acc["alice"],
-            "nonce": w3.eth.get_transaction_count(acc["alice"]),
-            "value": price * (remaining + 1),
-            "gas": 7_000_000, "gasPrice": 0
-        })
-        w3.eth.wait_for_transaction_receipt(w3.eth.send_transaction(tx))
+    # The required msg.value can exceed alice's ETH, which eth-tester rejects before execution (ValidationError).
+    with pytest.raises((ContractLogicError, ValidationError)):
+        _send(env_fresh, coin.functions.buy(remaining + 1, price, deadline), sender=acc["alice"],
+              value=price * (remaining + 1))
 
 
-def test_direct_eth_send_reverts(env):
+def test_direct_eth_send_reverts(env_fresh):
     """If your contract rejects plain ETH (no function), sending to fallback should revert. If it allows, skip."""
-    w3, coin, acc = env["w3"], env["coin"], env["acc"]
-    # Try a raw value transfer. Some designs accept deposits; if so, we skip.
+    w3, coin, acc = env_fresh["w3"], env_fresh["coin"], env_fresh["acc"]
+    # Probe with eth_call first (no state change). Some designs accept deposits; if so, we skip.
     try:
-        with pytest.raises(Exception):
-            w3.eth.wait_for_transaction_receipt(w3.eth.send_transaction({
-                "from": acc["alice"],
-                "to": coin.address,
-                "value": 1,
-                "nonce": w3.eth.get_transaction_count(acc["alice"]),
-                "gas": 21000, "gasPrice": 0
-            }))
-    except ContractLogicError:
-        # Already a revert (acceptable)
+        w3.eth.call({"from": acc["alice"], "to": coin.address, "value": 1})
+    except (ContractLogicError, TransactionFailed):
+        # eth_call bypasses _transact, so eth-tester's own TransactionFailed can surface here.
         pass
-    except Exception:
-        # if it succeeded, the contract purposely accepts ETH; consider that acceptable and skip strictness
+    else:
         pytest.skip("Contract accepts raw ETH; by design.")
 
+    with pytest.raises(ContractLogicError):
+        # DEFAULT_GAS so the receive/fallback path actually executes (21000 is only the intrinsic cost).
+        _send(env_fresh, {"to": coin.address}, sender=acc["alice"], value=1)
+
 
 # ===== Optional: ABI / Interface sanity checks =====
 
-def test_abi_surface_minimum(env):
-    coin: Contract = env["coin"]
-    names = {f["name"] for f in coin.abi if f.get("type") == "function"}
+def test_abi_surface_minimum(env_fresh):
+    names = env_fresh["fns"]
     minimum = {"buy", "buyTo", "currentPrice", "maxPerTx", "pause", "unpause", "withdraw", "balanceOf", "transfer", "name", "symbol"}
     missing = sorted(list(minimum - names))
     if missing: